@@ -2,20 +2,71 @@
 """Backup script: syncs files per backup-config.json, commits, bundles."""
 
 import argparse
+import atexit
+import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, datetime, timedelta
 import glob as globmod
+import hashlib
+import heapq
+import http.client
 import logging
-import re
 import json
 import os
 import shutil
+import stat
 import subprocess
 import sys
-import urllib.request
+import threading
 import urllib.parse
+import urllib.request
+
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
 
 log = logging.getLogger("backup")
 
+HOME = os.path.expanduser("~")
+
+# Default worker count for concurrent syncs, pre-sync commands and deletions
+DEFAULT_JOBS = min(8, os.cpu_count() or 1)
+
+LOG_BUFFER_SIZE = 64 * 1024
+
+# Every fd Python opens is non-inheritable (PEP 446), so on Linux children
+# can skip closing up to RLIMIT_NOFILE descriptors after fork
+_CLOSE_FDS = not sys.platform.startswith("linux")
+
+
+class _BufferedFileHandler(logging.FileHandler):
+    """FileHandler that writes through a large buffer instead of flushing every record.
+
+    The buffer is flushed when full, by flush_logs() on failure paths, and at exit.
+    """
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=LOG_BUFFER_SIZE,
+                    encoding=self.encoding, errors=self.errors)
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+def flush_logs():
+    """Flush buffered log output to disk."""
+    for handler in log.handlers:
+        handler.flush()
+
 
 def setup_logging(backup_repo):
     """Set up logging to both terminal and per-run log file under __log__/."""
@@ -28,7 +79,7 @@ def setup_logging(backup_repo):
     formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s",
                                   datefmt="%Y-%m-%d %H:%M:%S")
 
-    file_handler = logging.FileHandler(log_file)
+    file_handler = _BufferedFileHandler(log_file)
     file_handler.setFormatter(formatter)
 
     stream_handler = logging.StreamHandler()
@@ -38,6 +89,7 @@ def setup_logging(backup_repo):
     log.setLevel(logging.DEBUG)
     log.addHandler(file_handler)
     log.addHandler(stream_handler)
+    atexit.register(file_handler.flush)
 
     log.info(f"Log file: {log_file}")
 
@@ -49,20 +101,59 @@ def setup_logging(backup_repo):
     return log_file
 
 
+# Kept open across notify_telegram calls so later sends skip the TLS handshake
+_telegram_conn = None
+
+TELEGRAM_HOST = "api.telegram.org"
+
+
+def _telegram_connection():
+    """Open an HTTPS connection to the Telegram API, tunnelled through https_proxy if set."""
+    proxy = urllib.request.getproxies().get("https")
+    if not proxy or urllib.request.proxy_bypass(TELEGRAM_HOST):
+        return http.client.HTTPSConnection(TELEGRAM_HOST, timeout=10)
+    if "://" not in proxy:
+        proxy = "http://" + proxy
+    parsed = urllib.parse.urlsplit(proxy)
+    headers = {}
+    if parsed.username:
+        credentials = urllib.parse.unquote(f"{parsed.username}:{parsed.password or ''}")
+        headers["Proxy-Authorization"] = "Basic " + base64.b64encode(credentials.encode()).decode()
+    conn = http.client.HTTPSConnection(parsed.hostname, parsed.port or 80, timeout=10)
+    conn.set_tunnel(TELEGRAM_HOST, 443, headers)
+    return conn
+
+
 def notify_telegram(telegram_config, message):
     """Send a notification via Telegram bot. Fails silently with a log warning."""
+    global _telegram_conn
     token = telegram_config.get("botToken", "")
     chat_id = telegram_config.get("chatId", "")
     if not token or not chat_id:
         log.debug("Telegram not configured (missing botToken or chatId), skipping notification")
         return
-    try:
-        params = urllib.parse.urlencode({"chat_id": chat_id, "text": message})
-        url = f"https://api.telegram.org/bot{token}/sendMessage?{params}"
-        urllib.request.urlopen(url, timeout=10)
-        log.debug("Telegram notification sent")
-    except Exception as e:
-        log.warning(f"Failed to send Telegram notification: {e}")
+    params = urllib.parse.urlencode({"chat_id": chat_id, "text": message})
+    # A kept-alive connection may have been dropped by the server; retry once on a fresh one
+    for _ in range(2):
+        reused = _telegram_conn is not None
+        if not reused:
+            _telegram_conn = _telegram_connection()
+        try:
+            _telegram_conn.request("GET", f"/bot{token}/sendMessage?{params}")
+            response = _telegram_conn.getresponse()
+            response.read()
+        except Exception as e:
+            _telegram_conn.close()
+            _telegram_conn = None
+            if reused and isinstance(e, ConnectionError):
+                continue
+            log.warning(f"Failed to send Telegram notification: {e}")
+            return
+        if response.status != 200:
+            log.warning(f"Failed to send Telegram notification: HTTP {response.status} {response.reason}")
+        else:
+            log.debug("Telegram notification sent")
+        return
 
 
 def parse_args():
@@ -88,18 +179,31 @@ def parse_args():
         action="store_true",
         help="Only sync and commit, skip bundle creation (for hourly runs)",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f"Max concurrent rsyncs and pre-sync commands (default: {DEFAULT_JOBS})",
+    )
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
 
 
 def load_config(backup_repo):
-    """Load and validate backup-config.json from the backup repo."""
+    """Load and validate backup-config.json from the backup repo.
+
+    Entry paths are expanded, and each entry's destination in the backup
+    repo is precomputed as entry["_dst"].
+    """
     config_path = os.path.join(backup_repo, "backup-config.json")
     if not os.path.isfile(config_path):
         log.error(f"Config not found: {config_path}")
         sys.exit(1)
 
-    with open(config_path) as f:
-        config = json.load(f)
+    with open(config_path, "rb") as f:
+        config = _json_loads(f.read())
 
     entries = config.get("entries", [])
     if not entries:
@@ -111,7 +215,13 @@ def load_config(backup_repo):
         if "path" not in entry:
             log.warning(f"Entry {i} missing 'path', skipping")
             continue
-        entry["path"] = os.path.expanduser(entry["path"])
+        path = entry["path"]
+        if path == "~" or path.startswith("~/"):
+            path = HOME + path[1:]
+        else:
+            path = os.path.expanduser(path)
+        entry["path"] = path
+        entry["_dst"] = dest_path(path, backup_repo)
         validated.append(entry)
 
     return config, validated
@@ -127,21 +237,80 @@ def dest_path(src_path, backup_repo):
     return os.path.join(backup_repo, "__root__", src_path.lstrip("/"))
 
 
-def _run(cmd, **kwargs):
-    """Run a subprocess command, log it and its output, return the result."""
+def _load_state(state_path):
+    """Load a JSON state file under __log__/, or {} if missing or unreadable."""
+    try:
+        with open(state_path, "rb") as f:
+            return _json_loads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state_path, state):
+    """Atomically write a JSON state file under __log__/."""
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+
+def _log_stream(stream, label, sink):
+    """Log each line of a child's output stream, optionally keeping it in sink.
+
+    Keeps draining even if logging a line fails, so the child never blocks
+    on a full pipe.
+    """
+    for line in stream:
+        if sink is not None:
+            sink.append(line)
+        try:
+            log.debug(f"    {label}: {line.rstrip()}")
+        except Exception:
+            pass
+    stream.close()
+
+
+def _run(cmd, input=None, timeout=None, capture_stdout=False, discard_stdout=False, **kwargs):
+    """Run a subprocess command, log it and its output, return the result.
+
+    Output is logged line by line as it arrives rather than buffered until
+    exit. stderr is kept on the result for error messages; stdout is only
+    kept when capture_stdout is set, for callers that parse it, and with
+    discard_stdout it goes straight to /dev/null without being read at all.
+    """
     if isinstance(cmd, list):
         cmd_str = " ".join(cmd)
     else:
         cmd_str = cmd
     log.debug(f"  $ {cmd_str}")
-    result = subprocess.run(cmd, capture_output=True, text=True, **kwargs)
-    if result.stdout and result.stdout.strip():
-        for line in result.stdout.strip().splitlines():
-            log.debug(f"    stdout: {line}")
-    if result.stderr and result.stderr.strip():
-        for line in result.stderr.strip().splitlines():
-            log.debug(f"    stderr: {line}")
-    return result
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE if input is not None else None,
+                            stdout=subprocess.DEVNULL if discard_stdout else subprocess.PIPE,
+                            stderr=subprocess.PIPE, encoding="utf-8", errors="replace", bufsize=1,
+                            close_fds=kwargs.pop("close_fds", _CLOSE_FDS), **kwargs)
+    stdout = [] if capture_stdout else None
+    stderr = []
+    readers = [threading.Thread(target=_log_stream, args=(proc.stderr, "stderr", stderr),
+                                daemon=True)]
+    if not discard_stdout:
+        readers.append(threading.Thread(target=_log_stream, args=(proc.stdout, "stdout", stdout),
+                                        daemon=True))
+    for reader in readers:
+        reader.start()
+    if input is not None:
+        try:
+            proc.stdin.write(input)
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+    try:
+        returncode = proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        raise
+    for reader in readers:
+        reader.join()
+    return subprocess.CompletedProcess(cmd, returncode, "".join(stdout or []), "".join(stderr))
 
 
 def _parse_refs(output):
@@ -154,10 +323,38 @@ def _parse_refs(output):
     return refs
 
 
-def _sync_git_repo(entry, backup_repo, dry_run):
-    """Sync a git repo entry by creating a bundle. Returns True on failure."""
+def _repo_refs(src):
+    """Return the repo's refs as a set of (sha, ref) tuples, like `git show-ref --head`.
+
+    Reads refs in-process with pygit2 when available, otherwise spawns git.
+    Returns None if the refs can't be read.
+    """
+    if pygit2 is None:
+        result = _run(["git", "-C", src, "show-ref", "--head"], capture_stdout=True)
+        return _parse_refs(result.stdout) if result.returncode == 0 else None
+
+    try:
+        repo = pygit2.Repository(src)
+        refs = set()
+        if not repo.head_is_unborn:
+            refs.add((str(repo.head.target), "HEAD"))
+        for name in repo.references:
+            refs.add((str(repo.references[name].resolve().target), name))
+    except (pygit2.GitError, KeyError, ValueError) as e:
+        log.debug(f"    pygit2 failed to read refs of {src}: {e}")
+        return None
+    return refs
+
+
+def _sync_git_repo(entry, backup_repo, dry_run, unverified, commit_only=False):
+    """Sync a git repo entry by creating a bundle. Returns True on failure.
+
+    Hourly (commit_only) runs skip `git bundle verify` and add the repo to
+    unverified instead; the next full run verifies its bundle even if the
+    refs haven't changed since, and removes it from unverified.
+    """
     src = entry["path"]
-    dst = dest_path(src, backup_repo) + ".bundle"
+    dst = entry["_dst"] + ".bundle"
 
     if not os.path.isdir(src):
         log.warning(f"  Git repo not found: {src}")
@@ -168,29 +365,37 @@ def _sync_git_repo(entry, backup_repo, dry_run):
         return True
 
     # Compare refs to skip if unchanged
-    result = _run(["git", "-C", src, "show-ref", "--head"])
-    repo_refs = _parse_refs(result.stdout) if result.returncode == 0 else None
+    repo_refs = _repo_refs(src)
 
     if os.path.isfile(dst):
-        result = _run(["git", "bundle", "list-heads", dst])
+        result = _run(["git", "bundle", "list-heads", dst], capture_stdout=True)
         bundle_refs = _parse_refs(result.stdout) if result.returncode == 0 else None
     else:
         bundle_refs = None
 
-    if repo_refs is not None and bundle_refs is not None and repo_refs == bundle_refs:
+    unchanged = repo_refs is not None and bundle_refs is not None and repo_refs == bundle_refs
+    if unchanged and (commit_only or src not in unverified):
         log.info(f"  Unchanged: {src}")
         return False
 
     if dry_run:
-        log.info(f"  [dry-run] Would bundle git repo: {src} -> {dst}")
+        if unchanged:
+            log.info(f"  [dry-run] Would verify bundle: {dst}")
+        else:
+            log.info(f"  [dry-run] Would bundle git repo: {src} -> {dst}")
         return False
 
-    os.makedirs(os.path.dirname(dst), exist_ok=True)
-    log.info(f"  Bundling {src} -> {dst}")
-    result = _run(["git", "-C", src, "bundle", "create", dst, "--all"])
-    if result.returncode != 0:
-        log.warning(f"  Bundle failed for {src}: {result.stderr.rstrip()}")
-        return True
+    if not unchanged:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        log.info(f"  Bundling {src} -> {dst}")
+        result = _run(["git", "-C", src, "bundle", "create", "--quiet", dst, "--all"])
+        if result.returncode != 0:
+            log.warning(f"  Bundle failed for {src}: {result.stderr.rstrip()}")
+            return True
+
+    if commit_only:
+        unverified.add(src)
+        return False
 
     result = _run(["git", "-C", src, "bundle", "verify", dst])
     if result.returncode != 0:
@@ -198,52 +403,296 @@ def _sync_git_repo(entry, backup_repo, dry_run):
         os.remove(dst)
         return True
     log.info(f"  Verified OK: {src}")
+    unverified.discard(src)
 
     return False
 
 
-def sync_entries(entries, backup_repo, dry_run):
-    """Sync each entry into the backup repo. Returns set of failed paths."""
-    failed = set()
-    for entry in entries:
-        if entry.get("type") == "git-repo":
-            if _sync_git_repo(entry, backup_repo, dry_run):
-                failed.add(entry["path"])
-            continue
+def _make_writable(path):
+    """Give the owner write and search permission on directory path, if missing."""
+    mode = stat.S_IMODE(os.stat(path).st_mode)
+    if mode & stat.S_IRWXU != stat.S_IRWXU:
+        os.chmod(path, mode | stat.S_IRWXU)
 
-        src = entry["path"]
-        dst = dest_path(src, backup_repo)
-        is_dir = os.path.isdir(src)
 
-        if not os.path.exists(src):
-            log.warning(f"Source not found: {src}")
-            failed.add(src)
-            continue
+def _rmtree_onerror(func, path, exc_info):
+    """shutil.rmtree error handler: retry once the parent directory is writable.
 
-        if is_dir:
-            # Directory sync: rsync -a --delete src/ dst/
-            cmd = ["rsync", "-a", "--delete"]
-            for pattern in entry.get("ignore", []):
-                cmd += ["--exclude", pattern]
-            cmd += [src.rstrip("/") + "/", dst.rstrip("/") + "/"]
-        else:
-            # Single file: rsync src dst (ensure parent exists)
-            cmd = ["rsync", src, dst]
+    Backed-up directories keep their source's mode, so they can be read-only.
+    """
+    _make_writable(os.path.dirname(path))
+    func(path)
 
-        if dry_run:
-            log.info(f"  [dry-run] {' '.join(cmd)}")
-            continue
 
-        # Ensure parent directory exists
-        os.makedirs(os.path.dirname(dst), exist_ok=True)
-        if is_dir:
-            os.makedirs(dst, exist_ok=True)
+def _remove_entry(entry):
+    """Remove a DirEntry, recursively if it is a real directory."""
+    if entry.is_dir(follow_symlinks=False):
+        shutil.rmtree(entry.path, onerror=_rmtree_onerror)
+    else:
+        os.remove(entry.path)
+
+
+def _local_sync(src, dst, errors):
+    """Mirror directory src into dst, like `rsync -a --delete src/ dst/`.
+
+    Files are copied only when size, mtime or mode differ, to a temporary
+    name that replaces the old copy once complete. Errors are collected in
+    errors rather than raised; once there are any, entries of dst missing
+    from src are no longer removed, as rsync skips deletions after I/O
+    errors. Directory and symlink modes and times are copied too; like
+    rsync, a read-only directory is made writable while it is updated and
+    gets its mode back afterwards. Devices, sockets and FIFOs are skipped,
+    as rsync -a does.
+    """
+    try:
+        if os.path.islink(dst) or (os.path.lexists(dst) and not os.path.isdir(dst)):
+            os.remove(dst)
+        os.makedirs(dst, exist_ok=True)
+        _make_writable(dst)
+        with os.scandir(dst) as it:
+            existing = {entry.name: entry for entry in it}
+        with os.scandir(src) as it:
+            children = list(it)
+    except OSError as e:
+        errors.append(e)
+        return
+
+    for child in children:
+        target = os.path.join(dst, child.name)
+        old = existing.pop(child.name, None)
+        tmp = os.path.join(dst, f".{child.name}.{os.getpid()}.tmp")
+        try:
+            if child.is_symlink():
+                link = os.readlink(child.path)
+                if old is not None and old.is_symlink() and os.readlink(old.path) == link:
+                    continue
+                os.symlink(link, tmp)
+                shutil.copystat(child.path, tmp, follow_symlinks=False)
+            elif child.is_dir():
+                _local_sync(child.path, target, errors)
+                continue
+            elif child.is_file():
+                st = child.stat()
+                if old is not None and old.is_file(follow_symlinks=False):
+                    old_st = old.stat(follow_symlinks=False)
+                    if (old_st.st_size, old_st.st_mtime_ns, old_st.st_mode) == \
+                            (st.st_size, st.st_mtime_ns, st.st_mode):
+                        continue
+                shutil.copy2(child.path, tmp)
+            else:
+                continue
+            if old is not None and old.is_dir(follow_symlinks=False):
+                _remove_entry(old)
+            os.replace(tmp, target)
+        except OSError as e:
+            errors.append(e)
+            if os.path.lexists(tmp):
+                os.remove(tmp)
 
+    try:
+        if not errors:
+            for old in existing.values():
+                _remove_entry(old)
+        # Last, since filling dst updates its mtime
+        shutil.copystat(src, dst)
+    except OSError as e:
+        errors.append(e)
+
+
+def _rsync_cmd(delta_xfer, *opts):
+    """Build an rsync command line.
+
+    Whole-file transfer (-W) is the default: between local disks the
+    rolling-checksum delta algorithm only costs CPU. delta_xfer (config
+    "deltaXfer": true) re-enables it for a remote destination.
+    """
+    cmd = ["rsync", *opts, "--no-motd"]
+    if not delta_xfer:
+        cmd.append("-W")
+    return cmd
+
+
+def _tree_digest(src):
+    """Digest of a source tree's metadata, or None on error.
+
+    Covers each path's size, mode, mtime and ctime, so any change to the
+    tree alters it.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    stack = [src.rstrip("/")]
+    try:
+        st = os.stat(stack[0])
+        h.update(f"{st.st_mode} {st.st_mtime_ns} {st.st_ctime_ns}\n".encode())
+        while stack:
+            with os.scandir(stack.pop()) as it:
+                children = sorted(it, key=lambda e: e.name)
+            for child in children:
+                st = child.stat(follow_symlinks=False)
+                h.update(os.fsencode(child.path))
+                h.update(f" {st.st_size} {st.st_mode} {st.st_mtime_ns} {st.st_ctime_ns}\n".encode())
+                if stat.S_ISDIR(st.st_mode):
+                    stack.append(child.path)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def _sync_dir(entry, dry_run, same_fs, manifest, delta_xfer=False):
+    """Sync a directory entry into the backup repo. Returns True on failure.
+
+    manifest maps source paths to the _tree_digest of their last successful
+    sync; the entry is skipped if its digest still matches, and the current
+    digest is recorded for the caller to keep on success. Entries with
+    ignore patterns always sync: the digest would cover the ignored paths
+    (typically caches and logs), so it would rarely match. Directories
+    without ignore patterns on the backup repo's filesystem (same_fs) are
+    mirrored in-process by _local_sync, skipping rsync's startup cost;
+    everything else goes through rsync.
+    """
+    src = entry["path"]
+    dst = entry["_dst"]
+
+    digest = None if entry.get("ignore") else _tree_digest(src)
+    if digest and digest == manifest.get(src) and os.path.isdir(dst):
+        log.info(f"  Unchanged: {src}")
+        return False
+    manifest[src] = digest
+
+    if not entry.get("ignore") and same_fs:
+        if dry_run:
+            log.info(f"  [dry-run] Would mirror {src} -> {dst}")
+            return False
         log.info(f"  Syncing {src} -> {dst}")
-        result = _run(cmd)
-        if result.returncode != 0:
-            log.warning(f"rsync failed for {src}: {result.stderr.rstrip()}")
+        errors = []
+        _local_sync(src, dst, errors)
+        if errors:
+            more = f" (and {len(errors) - 1} more)" if len(errors) > 1 else ""
+            log.warning(f"Local sync failed for {src}: {errors[0]}{more}")
+            return True
+        return False
+
+    # Directory sync: rsync -a --delete src/ dst/
+    cmd = _rsync_cmd(delta_xfer, "-a", "--delete")
+    for pattern in entry.get("ignore", []):
+        cmd += ["--exclude", pattern]
+    cmd += [src.rstrip("/") + "/", dst.rstrip("/") + "/"]
+
+    if dry_run:
+        log.info(f"  [dry-run] {' '.join(cmd)}")
+        return False
+
+    # rsync creates dst itself, but not its missing parents
+    os.makedirs(os.path.dirname(dst.rstrip("/")), exist_ok=True)
+
+    log.info(f"  Syncing {src} -> {dst}")
+    result = _run(cmd, discard_stdout=True)
+    if result.returncode != 0:
+        log.warning(f"rsync failed for {src}: {result.stderr.rstrip()}")
+        return True
+    return False
+
+
+def _sync_files(paths, backup_repo, dry_run, delta_xfer=False):
+    """Sync single-file entries with one rsync run. Returns True on failure.
+
+    Paths are fed to rsync on stdin relative to /, and -R recreates the
+    full source path (and its parents) under __root__/.
+    """
+    root_dir = os.path.join(backup_repo, "__root__")
+    cmd = _rsync_cmd(delta_xfer, "-aR", "--from0", "--files-from=-") + ["/", root_dir + "/"]
+
+    if dry_run:
+        for src in paths:
+            log.info(f"  [dry-run] Would sync {src} -> {dest_path(src, backup_repo)}")
+        return False
+
+    log.info(f"  Syncing {len(paths)} file(s) -> {root_dir}")
+    result = _run(cmd, input="\0".join(src.lstrip("/") for src in paths), discard_stdout=True)
+    if result.returncode != 0:
+        log.warning(f"rsync failed for file entries: {result.stderr.rstrip()}")
+        return True
+    return False
+
+
+def sync_entries(entries, backup_repo, dry_run, commit_only=False, jobs=DEFAULT_JOBS,
+                 delta_xfer=False):
+    """Sync each entry into the backup repo concurrently. Returns set of failed paths.
+
+    Plain file entries are batched into a single rsync and directories are
+    rsynced individually on an I/O pool. Git repos are bundled on a separate
+    pool sized to the CPU count, since git's packing is CPU-bound.
+
+    An entry whose destination lies inside a directory entry's destination
+    would race with that directory's --delete, so entries run in waves by
+    nesting depth: nested entries start once all their ancestors are done.
+    """
+    failed = set()
+    files = []
+    dirs = []  # (entry, same filesystem as backup_repo)
+    git_repos = []
+    repo_dev = os.stat(backup_repo).st_dev
+
+    # Per-directory tree digests from the last run, updated by _sync_dir, and
+    # git repos whose bundles an hourly run hasn't verified, updated by _sync_git_repo
+    state_path = os.path.join(backup_repo, "__log__", "sync-state.json")
+    state = _load_state(state_path)
+    manifest = state.get("entries", {})
+    unverified = set(state.get("unverified_bundles", []))
+
+    for entry in entries:
+        src = entry["path"]
+        if entry.get("type") == "git-repo":
+            git_repos.append(entry)
+            continue
+        # One stat per entry decides both existence and type
+        try:
+            st = os.stat(src)
+        except OSError:
+            log.warning(f"Source not found: {src}")
             failed.add(src)
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            dirs.append((entry, st.st_dev == repo_dev))
+        else:
+            files.append(src)
+
+    # Nesting depth of each entry's destination under directory entries'
+    ancestors = [entry["_dst"].rstrip("/") + "/" for entry, _ in dirs]
+    depth = {entry["path"]: sum(entry["_dst"].startswith(a) for a in ancestors)
+             for entry in git_repos + [entry for entry, _ in dirs]}
+    depth.update((src, sum(dest_path(src, backup_repo).startswith(a) for a in ancestors))
+                 for src in files)
+
+    rsync_tasks = len(dirs) + (1 if files else 0)
+    rsync_workers = max(1, min(jobs, rsync_tasks))
+    git_workers = max(1, min(os.cpu_count() or 1, len(git_repos)))
+    with ThreadPoolExecutor(max_workers=rsync_workers) as rsync_pool, \
+            ThreadPoolExecutor(max_workers=git_workers) as git_pool:
+        for level in range(max(depth.values(), default=-1) + 1):
+            futures = {}
+            for entry in git_repos:
+                if depth[entry["path"]] == level:
+                    future = git_pool.submit(_sync_git_repo, entry, backup_repo, dry_run,
+                                             unverified, commit_only)
+                    futures[future] = [entry["path"]]
+            for entry, same_fs in dirs:
+                if depth[entry["path"]] == level:
+                    future = rsync_pool.submit(_sync_dir, entry, dry_run, same_fs, manifest,
+                                               delta_xfer)
+                    futures[future] = [entry["path"]]
+            level_files = [src for src in files if depth[src] == level]
+            if level_files:
+                future = rsync_pool.submit(_sync_files, level_files, backup_repo, dry_run,
+                                           delta_xfer)
+                futures[future] = level_files
+            for future in as_completed(futures):
+                if future.result():
+                    failed.update(futures[future])
+
+    if not dry_run:
+        synced = {entry["path"]: manifest[entry["path"]] for entry, _ in dirs
+                  if entry["path"] not in failed and manifest.get(entry["path"])}
+        _save_state(state_path, {"entries": synced, "unverified_bundles": sorted(unverified)})
     return failed
 
 
@@ -252,113 +701,179 @@ SPECIAL_NAMES = {".git", "backup-config.json", "README.md", ".gitignore", "__log
                  "net.xzer.work-backup-bundle.plist"}
 
 
+# Marks a trie node whose path is itself a config entry destination.
+_LEAF = object()
+
+
 def cleanup_removed_entries(entries, backup_repo, dry_run):
-    """Remove files/dirs under __root__/ that don't belong to any config entry."""
+    """Remove files/dirs under __root__/ that don't belong to any config entry.
+
+    Only entries dropped from the config leave orphans here (rsync --delete
+    and _local_sync handle removals inside an entry), so the walk is skipped
+    when backup-config.json hasn't changed since the last completed cleanup.
+    """
     root_dir = os.path.join(backup_repo, "__root__")
     if not os.path.isdir(root_dir):
         return []
 
-    # Build set of expected dest paths (absolute)
-    expected = set()
+    state_path = os.path.join(backup_repo, "__log__", "cleanup-state.json")
+    config_mtime_ns = os.stat(os.path.join(backup_repo, "backup-config.json")).st_mtime_ns
+    if _load_state(state_path).get("config_mtime_ns") == config_mtime_ns:
+        log.info("  Config unchanged since last cleanup, skipping walk")
+        return []
+
+    # Build a trie of expected dest paths, keyed by path component under __root__/
+    expected = {}
+    prefix_len = len(root_dir) + 1
     for entry in entries:
-        dst = dest_path(entry["path"], backup_repo)
+        dst = entry["_dst"]
         if entry.get("type") == "git-repo":
             dst += ".bundle"
-        expected.add(dst)
+        node = expected
+        for part in dst[prefix_len:].split("/"):
+            if part:
+                node = node.setdefault(part, {})
+        node[_LEAF] = True
 
     removed = []
     _cleanup_dir(root_dir, expected, dry_run, removed)
+    if not dry_run:
+        _save_state(state_path, {"config_mtime_ns": config_mtime_ns,
+                                 "last_cleanup_ts": datetime.now().isoformat(timespec="seconds")})
     return removed
 
 
-def _is_ancestor(path, expected):
-    """Check if path is a parent/ancestor directory of any expected entry."""
-    prefix = path.rstrip("/") + "/"
-    return any(e.startswith(prefix) for e in expected)
+def _cleanup_dir(dir_path, node, dry_run, removed):
+    """Clean descendants of a directory that aren't covered by entries.
 
+    node is the expected-path trie node for dir_path: a child missing from
+    it is removed, a leaf child is an entry (rsync manages its contents),
+    and any other child is an ancestor of deeper entries. Walks with an
+    explicit stack rather than recursion.
+    """
+    stack = [(dir_path, node)]
+    while stack:
+        dir_path, node = stack.pop()
+        with os.scandir(dir_path) as it:
+            children = list(it)
+        for child in children:
+            full = child.path
+            child_node = node.get(child.name)
+            if child_node is not None:
+                # Only descend into ancestor dirs (they contain expected entries deeper down).
+                # Don't descend into expected dirs themselves — rsync manages their contents.
+                if _LEAF not in child_node and child.is_dir(follow_symlinks=False):
+                    stack.append((full, child_node))
+                continue
+            if dry_run:
+                log.info(f"  [dry-run] Would remove: {full}")
+            else:
+                log.info(f"  Removing: {full}")
+                if child.is_dir(follow_symlinks=False):
+                    shutil.rmtree(full, onerror=_rmtree_onerror)
+                else:
+                    os.remove(full)
+            removed.append(full)
 
-def _is_covered(path, expected):
-    """Check if path is covered by any expected entry (exact, ancestor, or descendant)."""
-    if path in expected:
-        return True
-    if _is_ancestor(path, expected):
-        return True
-    # Check if path is inside an expected directory entry
-    for e in expected:
-        if path.startswith(e.rstrip("/") + "/"):
-            return True
-    return False
 
+def _pygit2_commit(backup_repo, msg):
+    """Stage all changes and commit in-process with pygit2. Returns True if a commit was made."""
+    log.debug(f"  pygit2: add -A + commit in {backup_repo}")
+    try:
+        repo = pygit2.Repository(backup_repo)
+        index = repo.index
+        index.add_all()
+        tree = index.write_tree()
+        if not repo.head_is_unborn and tree == repo.head.peel(pygit2.Tree).id:
+            index.write()
+            log.info("  No changes to commit")
+            return False
+        signature = repo.default_signature
+        parents = [] if repo.head_is_unborn else [repo.head.target]
+        repo.create_commit("HEAD", signature, signature, msg, tree, parents)
+        index.write()
+    except (pygit2.GitError, KeyError, ValueError) as e:
+        log.error(f"git commit failed: {e}")
+        sys.exit(1)
 
-def _cleanup_dir(dir_path, expected, dry_run, removed):
-    """Recursively clean children of a directory that aren't covered by entries."""
-    for name in os.listdir(dir_path):
-        full = os.path.join(dir_path, name)
-        if _is_covered(full, expected):
-            # Only recurse into ancestor dirs (they contain expected entries deeper down).
-            # Don't recurse into expected dirs themselves — rsync manages their contents.
-            if os.path.isdir(full) and not os.path.islink(full) and _is_ancestor(full, expected):
-                _cleanup_dir(full, expected, dry_run, removed)
-            continue
-        if dry_run:
-            log.info(f"  [dry-run] Would remove: {full}")
-        else:
-            log.info(f"  Removing: {full}")
-            if os.path.islink(full):
-                os.remove(full)
-            elif os.path.isdir(full):
-                shutil.rmtree(full)
-            else:
-                os.remove(full)
-        removed.append(full)
+    log.info(f"  Committed: {msg}")
+    return True
 
 
-def git_auto_commit(backup_repo, dry_run):
-    """Stage all changes and commit if there are any. Returns True if a commit was made."""
+def git_auto_commit(backup_repo, dry_run, now):
+    """Stage all changes and commit if there are any. Returns True if a commit was made.
+
+    Runs in-process with pygit2 when available, otherwise spawns git.
+    """
+    msg = f"backup: sync {now.strftime('%Y-%m-%d %H:%M:%S')}"
+    if pygit2 is not None and not dry_run:
+        return _pygit2_commit(backup_repo, msg)
+
+    # One status call covers the common no-op run without spawning add/commit.
+    # Untracked files are requested explicitly so status.showUntrackedFiles=no
+    # can't hide new files.
+    result = _run(["git", "-C", backup_repo, "status", "--porcelain", "--untracked-files=normal"],
+                  capture_stdout=True)
+    if result.returncode != 0:
+        log.error(f"git status failed: {result.stderr.rstrip()}")
+        sys.exit(1)
+    changes = result.stdout.strip()
+
     if dry_run:
-        result = _run(["git", "-C", backup_repo, "status", "--short"])
-        if result.stdout.strip():
+        if changes:
             log.info("  [dry-run] Would commit changes:")
-            for line in result.stdout.strip().splitlines():
+            for line in changes.splitlines():
                 log.info(f"    {line}")
         else:
             log.info("  [dry-run] No changes to commit")
         return False
 
+    if not changes:
+        log.info("  No changes to commit")
+        return False
+
     # Stage everything
-    result = _run(["git", "-C", backup_repo, "add", "-A"])
+    result = _run(["git", "-C", backup_repo, "add", "-A"], discard_stdout=True)
     if result.returncode != 0:
         log.error(f"git add failed: {result.stderr.rstrip()}")
         sys.exit(1)
 
-    # Check if there are staged changes
-    result = subprocess.run(
-        ["git", "-C", backup_repo, "diff", "--cached", "--quiet"],
-    )
+    # status can list changes that stage nothing, e.g. a nested repo's dirty
+    # worktree; exit code 0 means the index matches HEAD
+    result = _run(["git", "-C", backup_repo, "diff", "--cached", "--quiet"])
     if result.returncode == 0:
         log.info("  No changes to commit")
         return False
+    if result.returncode != 1:
+        log.error(f"git diff failed: {result.stderr.rstrip()}")
+        sys.exit(1)
 
     # Commit
-    msg = f"backup: sync {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-    result = _run(["git", "-C", backup_repo, "commit", "-m", msg])
+    result = _run(["git", "-C", backup_repo, "commit", "--quiet", "-m", msg],
+                  capture_stdout=True)
     if result.returncode != 0:
-        log.error(f"git commit failed: {result.stderr.rstrip()}")
+        log.error(f"git commit failed: {(result.stderr or result.stdout).rstrip()}")
         sys.exit(1)
 
     log.info(f"  Committed: {msg}")
     return True
 
 
-def create_bundle(backup_repo, bundle_dir, dry_run):
-    """Create a git bundle, verify it, and copy to bundle_dir if configured."""
-    filename = f"work-backup-{datetime.now().strftime('%Y-%m-%d')}.bundle"
+def create_bundle(backup_repo, bundle_dir, dry_run, now, verify_bundle=True):
+    """Create a git bundle, verify it, and move it to bundle_dir if configured.
+
+    With verify_bundle off (config "verifyBundle": false) the bundle is only
+    checked to be non-empty. That saves re-reading a possibly multi-GB
+    bundle, relying on git having checksummed the pack as it wrote it, but
+    no longer catches a bundle that is unusable for restore.
+    """
+    filename = f"work-backup-{now.strftime('%Y-%m-%d')}.bundle"
     bundle_path = os.path.join(backup_repo, filename)
 
     if dry_run:
         log.info(f"  [dry-run] Would create bundle: {bundle_path}")
         if bundle_dir:
-            log.info(f"  [dry-run] Would copy to: {os.path.join(bundle_dir, filename)}")
+            log.info(f"  [dry-run] Would move to: {os.path.join(bundle_dir, filename)}")
         return
 
     # Create bundle
@@ -368,47 +883,109 @@ def create_bundle(backup_repo, bundle_dir, dry_run):
         log.error(f"Bundle creation failed: {result.stderr.rstrip()}")
         sys.exit(1)
 
-    # Verify bundle
-    log.info("  Verifying bundle...")
-    result = _run(["git", "-C", backup_repo, "bundle", "verify", bundle_path])
-    if result.returncode != 0:
-        log.error(f"Bundle verification failed: {result.stderr.rstrip()}")
+    dest = None
+    same_fs = False
+    if bundle_dir:
+        os.makedirs(bundle_dir, exist_ok=True)
+        dest = os.path.join(bundle_dir, filename)
+        same_fs = os.stat(backup_repo).st_dev == os.stat(bundle_dir).st_dev
+
+    # Verify bundle. A cross-filesystem copy has to read the whole bundle too,
+    # so it runs alongside verification, to a temporary name until verified.
+    if verify_bundle:
+        log.info("  Verifying bundle...")
+    copy_tmp = None
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        verify = None
+        if verify_bundle:
+            verify = executor.submit(_run, ["git", "-C", backup_repo, "bundle", "verify",
+                                            "--quiet", bundle_path])
+        if dest and not same_fs:
+            copy_tmp = dest + ".tmp"
+            try:
+                shutil.copyfile(bundle_path, copy_tmp)
+            except Exception:
+                # Don't leave a partial copy in bundle_dir for retention to miss
+                if os.path.exists(copy_tmp):
+                    os.remove(copy_tmp)
+                raise
+        result = verify.result() if verify else None
+    if verify_bundle:
+        error = result.stderr.rstrip() if result.returncode != 0 else None
+    else:
+        error = "bundle is empty" if os.path.getsize(bundle_path) == 0 else None
+    if error:
+        log.error(f"Bundle verification failed: {error}")
         log.error("Keeping previous bundle. Investigate the error.")
         os.remove(bundle_path)
+        if copy_tmp:
+            os.remove(copy_tmp)
         sys.exit(1)
-    log.info("  Bundle verified OK")
+    if verify_bundle:
+        log.info("  Bundle verified OK")
+    else:
+        log.info("  Bundle verification skipped (verifyBundle: false)")
 
-    # Copy to bundle dir if configured
-    if bundle_dir:
-        os.makedirs(bundle_dir, exist_ok=True)
-        dest = os.path.join(bundle_dir, filename)
-        shutil.copy2(bundle_path, dest)
+    # Move to bundle dir if configured; otherwise just clean up the bundle
+    # from the repo dir (it's not meant to be committed)
+    if copy_tmp:
+        os.replace(copy_tmp, dest)
+        os.remove(bundle_path)
         log.info(f"  Copied to: {dest}")
-
-    # Clean up bundle from repo dir (it's not meant to be committed)
-    os.remove(bundle_path)
+    elif dest:
+        os.replace(bundle_path, dest)
+        log.info(f"  Moved to: {dest}")
+    else:
+        os.remove(bundle_path)
 
 
-BUNDLE_RE = re.compile(r"^work-backup-(\d{4}-\d{2}-\d{2})\.(bundle|skipped)$")
 MAX_CONSECUTIVE_SKIPPED = 10
 
 
-def should_force_bundle(bundle_dir):
-    """Return True if last MAX_CONSECUTIVE_SKIPPED entries are all .skipped."""
+def _parse_bundle_name(name):
+    """Parse work-backup-YYYY-MM-DD.{bundle,skipped}.
+
+    Returns (bundle_date, is_skipped), or None if name doesn't match.
+    """
+    ext = name[22:]
+    if (not name.startswith("work-backup-") or ext not in (".bundle", ".skipped")
+            or name[16] != "-" or name[19] != "-"):
+        return None
+    try:
+        return date.fromisoformat(name[12:22]), ext == ".skipped"
+    except ValueError:
+        return None
+
+
+def _list_bundles(bundle_dir):
+    """List work-backup-YYYY-MM-DD.{bundle,skipped} files in bundle_dir.
+
+    Returns (path, bundle_date, is_skipped) tuples in directory order;
+    tuples compare by path, i.e. by date. Reads the directory once so
+    callers can share the result.
+    """
     if not bundle_dir or not os.path.isdir(bundle_dir):
-        return False
-    entries = sorted(globmod.glob(os.path.join(bundle_dir, "work-backup-*.*")))
-    # Filter to only matching entries
-    entries = [e for e in entries if BUNDLE_RE.match(os.path.basename(e))]
-    recent = entries[-MAX_CONSECUTIVE_SKIPPED:]
+        return []
+    bundles = []
+    with os.scandir(bundle_dir) as it:
+        for entry in it:
+            parsed = _parse_bundle_name(entry.name)
+            if parsed:
+                bundles.append((entry.path, *parsed))
+    return bundles
+
+
+def should_force_bundle(bundles):
+    """Return True if last MAX_CONSECUTIVE_SKIPPED entries are all .skipped."""
+    recent = heapq.nlargest(MAX_CONSECUTIVE_SKIPPED, bundles)
     if len(recent) < MAX_CONSECUTIVE_SKIPPED:
         return False
-    return all(e.endswith(".skipped") for e in recent)
+    return all(is_skipped for _, _, is_skipped in recent)
 
 
-def create_skipped_marker(bundle_dir, dry_run):
+def create_skipped_marker(bundle_dir, dry_run, now):
     """Create a 0-byte .skipped placeholder in bundle_dir."""
-    filename = f"work-backup-{datetime.now().strftime('%Y-%m-%d')}.skipped"
+    filename = f"work-backup-{now.strftime('%Y-%m-%d')}.skipped"
     if dry_run:
         log.info(f"  [dry-run] Would create skipped marker: {filename}")
         return
@@ -418,23 +995,34 @@ def create_skipped_marker(bundle_dir, dry_run):
     log.info(f"  Created skipped marker: {filename}")
 
 
-def has_unbundled_commits(backup_repo, bundle_dir):
-    """Check if backup repo HEAD differs from the last bundle's commit."""
-    result = _run(["git", "-C", backup_repo, "rev-parse", "HEAD"])
-    if result.returncode != 0:
-        return True
-    head = result.stdout.strip()
+def _head_sha(repo_path):
+    """Return the sha HEAD points to, or None if it can't be resolved."""
+    if pygit2 is None:
+        result = _run(["git", "-C", repo_path, "rev-parse", "HEAD"], capture_stdout=True)
+        return result.stdout.strip() if result.returncode == 0 else None
 
-    if not bundle_dir or not os.path.isdir(bundle_dir):
-        return True
+    try:
+        repo = pygit2.Repository(repo_path)
+        return None if repo.head_is_unborn else str(repo.head.target)
+    except (pygit2.GitError, KeyError, ValueError) as e:
+        log.debug(f"    pygit2 failed to resolve HEAD of {repo_path}: {e}")
+        return None
 
-    bundles = sorted(globmod.glob(os.path.join(bundle_dir, "work-backup-*.bundle")))
-    if not bundles:
+
+def has_unbundled_commits(backup_repo, bundles):
+    """Check if backup repo HEAD differs from the last bundle's commit."""
+    last_bundle = max((path for path, _, is_skipped in bundles if not is_skipped), default=None)
+    if last_bundle is None:
         return True
 
-    last_bundle = bundles[-1]
-    result = _run(["git", "bundle", "list-heads", last_bundle])
-    if result.returncode != 0:
+    # HEAD and the bundle's heads are independent, so look them up concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        head_future = executor.submit(_head_sha, backup_repo)
+        heads_future = executor.submit(_run, ["git", "bundle", "list-heads", last_bundle],
+                                       capture_stdout=True)
+        head = head_future.result()
+        result = heads_future.result()
+    if head is None or result.returncode != 0:
         return True
 
     for line in result.stdout.strip().splitlines():
@@ -445,26 +1033,22 @@ def has_unbundled_commits(backup_repo, bundle_dir):
     return True
 
 
-def retention_cleanup(bundle_dir, dry_run):
-    """Apply GFS retention policy to bundles in bundle_dir."""
-    today = date.today()
-    bundles = []
-    for path in sorted(globmod.glob(os.path.join(bundle_dir, "work-backup-*.*"))):
-        m = BUNDLE_RE.match(os.path.basename(path))
-        if not m:
-            continue
-        bundle_date = date.fromisoformat(m.group(1))
-        bundles.append((path, bundle_date))
+def retention_cleanup(bundles, dry_run, today):
+    """Apply GFS retention policy to bundles listed by _list_bundles."""
 
     if not bundles:
         log.info("  No bundles found")
         return
 
+    # Newest first, so the first bundle seen in a week/month is the last one
+    # made in it. On the same date a real .bundle is preferred over .skipped.
+    bundles = sorted(bundles, key=lambda b: (b[1], not b[2]), reverse=True)
+
     keep = set()
-    weekly_kept = {}   # (iso_year, iso_week) -> latest date
-    monthly_kept = {}  # (year, month) -> latest date
+    seen_weeks = set()   # (iso_year, iso_week)
+    seen_months = set()  # (year, month)
 
-    for path, d in bundles:
+    for path, d, _ in bundles:
         age = (today - d).days
         if age <= 30:
             # Daily tier: keep all
@@ -472,55 +1056,74 @@ def retention_cleanup(bundle_dir, dry_run):
         elif age <= 89:
             # Weekly tier: keep last bundle per ISO week
             key = d.isocalendar()[:2]
-            if key not in weekly_kept or d > weekly_kept[key][1]:
-                weekly_kept[key] = (path, d)
+            if key not in seen_weeks:
+                seen_weeks.add(key)
+                keep.add(path)
         elif age <= 364:
             # Monthly tier: keep last bundle per month
             key = (d.year, d.month)
-            if key not in monthly_kept or d > monthly_kept[key][1]:
-                monthly_kept[key] = (path, d)
+            if key not in seen_months:
+                seen_months.add(key)
+                keep.add(path)
         # else: expired (365+), don't keep
 
-    for path, _ in weekly_kept.values():
-        keep.add(path)
-    for path, _ in monthly_kept.values():
-        keep.add(path)
-
-    to_delete = [path for path, _ in bundles if path not in keep]
+    to_delete = sorted(path for path, _, _ in bundles if path not in keep)
     if not to_delete:
         log.info(f"  All {len(bundles)} bundle(s) retained")
         return
 
-    for path in to_delete:
-        if dry_run:
+    if dry_run:
+        for path in to_delete:
             log.info(f"  [dry-run] Would delete: {os.path.basename(path)}")
-        else:
-            os.remove(path)
-            log.info(f"  Deleted: {os.path.basename(path)}")
+    else:
+        with ThreadPoolExecutor(max_workers=DEFAULT_JOBS) as executor:
+            list(executor.map(os.remove, to_delete))
+        for path in to_delete:
+            log.debug(f"  Deleted: {os.path.basename(path)}")
 
     log.info(f"  Kept {len(keep)}, deleted {len(to_delete)}")
 
 
-def run_pre_sync_commands(entries, dry_run):
-    """Run preSyncCommand for entries that define one. Returns set of failed paths."""
+def _run_pre_sync(entry, dry_run):
+    """Run one entry's preSyncCommand. Returns True on failure."""
+    cmd = entry["preSyncCommand"]
+    path = entry["path"]
+    if dry_run:
+        log.info(f"  [dry-run] Would run pre-sync: {cmd}")
+        return False
+    log.info(f"  Running pre-sync for {path}: {cmd}")
+    try:
+        result = _run(cmd, shell=True, timeout=60)
+        if result.returncode != 0:
+            log.warning(f"Pre-sync failed (exit {result.returncode}) for {path}")
+            return True
+    except subprocess.TimeoutExpired:
+        log.warning(f"Pre-sync timed out for {path}")
+        return True
+    return False
+
+
+def run_pre_sync_commands(entries, dry_run, parallel=False, jobs=DEFAULT_JOBS):
+    """Run preSyncCommand for entries that define one. Returns set of failed paths.
+
+    Commands run one at a time in config order unless parallel is set
+    (config "parallelPreSync"), in which case up to jobs run concurrently.
+    """
     failed = set()
-    for entry in entries:
-        cmd = entry.get("preSyncCommand")
-        if not cmd:
-            continue
-        path = entry["path"]
-        if dry_run:
-            log.info(f"  [dry-run] Would run pre-sync: {cmd}")
-            continue
-        log.info(f"  Running pre-sync for {path}: {cmd}")
-        try:
-            result = _run(cmd, shell=True, timeout=60)
-            if result.returncode != 0:
-                log.warning(f"Pre-sync failed (exit {result.returncode}) for {path}")
-                failed.add(path)
-        except subprocess.TimeoutExpired:
-            log.warning(f"Pre-sync timed out for {path}")
-            failed.add(path)
+    pending = [entry for entry in entries if entry.get("preSyncCommand")]
+    if not parallel:
+        for entry in pending:
+            if _run_pre_sync(entry, dry_run):
+                failed.add(entry["path"])
+        return failed
+    if not pending:
+        return failed
+    with ThreadPoolExecutor(max_workers=min(jobs, len(pending))) as executor:
+        futures = {executor.submit(_run_pre_sync, entry, dry_run): entry["path"]
+                   for entry in pending}
+        for future in as_completed(futures):
+            if future.result():
+                failed.add(futures[future])
     return failed
 
 
@@ -530,6 +1133,9 @@ def main():
     backup_repo = os.path.abspath(backup_repo)
     dry_run = args.dry_run
     commit_only = args.commit_only
+    # One timestamp for the whole run, so the commit message, bundle name and
+    # retention ages agree even if the run crosses midnight
+    now = datetime.now()
 
     if not os.path.isdir(backup_repo):
         print(f"ERROR: Backup repo not found: {backup_repo}", file=sys.stderr)
@@ -557,6 +1163,9 @@ def main():
         bundle_dir = os.path.expanduser(bundle_dir)
         bundle_dir = os.path.abspath(bundle_dir)
     notify_success = config.get("notifyOnSuccess", False)
+    parallel_pre_sync = config.get("parallelPreSync", False)
+    verify_bundle = config.get("verifyBundle", True)
+    delta_xfer = config.get("deltaXfer", False)
 
     log.info(f"Entries: {len(entries)}")
     if bundle_dir:
@@ -571,18 +1180,20 @@ def main():
     try:
         # Pre-sync commands
         log.info("\n--- Pre-sync commands ---")
-        failed_paths = run_pre_sync_commands(entries, dry_run)
+        failed_paths = run_pre_sync_commands(entries, dry_run, parallel_pre_sync, args.jobs)
         if failed_paths:
             log.info(f"  {len(failed_paths)} entry(ies) failed pre-sync, will be skipped")
         active_entries = [e for e in entries if e["path"] not in failed_paths]
 
         # Sync files
         log.info("\n--- Syncing files ---")
-        sync_failed = sync_entries(active_entries, backup_repo, dry_run)
+        sync_failed = sync_entries(active_entries, backup_repo, dry_run, commit_only, args.jobs,
+                                   delta_xfer)
         if sync_failed:
             log.info(f"  {len(sync_failed)} entry(ies) failed to sync")
 
-        # Cleanup removed entries
+        # Cleanup removed entries. Pass all entries, failed ones included, so a
+        # failed pre-sync or sync keeps its last good backup.
         log.info("\n--- Cleanup ---")
         removed = cleanup_removed_entries(entries, backup_repo, dry_run)
         if removed:
@@ -592,7 +1203,7 @@ def main():
 
         # Git auto-commit
         log.info("\n--- Git commit ---")
-        git_auto_commit(backup_repo, dry_run)
+        git_auto_commit(backup_repo, dry_run, now)
 
         # commit-only mode: stop here
         if commit_only:
@@ -600,8 +1211,9 @@ def main():
             return
 
         # Full mode: decide whether to create a bundle
-        unbundled = has_unbundled_commits(backup_repo, bundle_dir)
-        force = not unbundled and should_force_bundle(bundle_dir)
+        bundles = _list_bundles(bundle_dir)
+        unbundled = has_unbundled_commits(backup_repo, bundles)
+        force = not unbundled and should_force_bundle(bundles)
 
         if unbundled or force:
             if force:
@@ -609,22 +1221,23 @@ def main():
 
             # Bundle creation + verification + copy
             log.info("\n--- Bundle ---")
-            create_bundle(backup_repo, bundle_dir, dry_run)
+            create_bundle(backup_repo, bundle_dir, dry_run, now, verify_bundle)
 
             # Retention cleanup
             if bundle_dir:
                 log.info("\n--- Retention cleanup ---")
-                retention_cleanup(bundle_dir, dry_run)
+                # Re-list: create_bundle just added today's bundle
+                retention_cleanup(_list_bundles(bundle_dir), dry_run, now.date())
 
             log.info("\nDone.")
             if notify_success and not dry_run:
-                filename = f"work-backup-{datetime.now().strftime('%Y-%m-%d')}.bundle"
+                filename = f"work-backup-{now.strftime('%Y-%m-%d')}.bundle"
                 notify_telegram(telegram_config,
                                 f"✅ Bundle created: {filename}")
         else:
             log.info("\n--- No changes since last bundle ---")
             if bundle_dir:
-                create_skipped_marker(bundle_dir, dry_run)
+                create_skipped_marker(bundle_dir, dry_run, now)
             log.info("\nDone.")
             if notify_success and not dry_run:
                 notify_telegram(telegram_config,
@@ -632,11 +1245,13 @@ def main():
 
     except SystemExit as e:
         if e.code != 0:
+            flush_logs()
             notify_telegram(telegram_config,
                             f"🚨 Backup failed (exit {e.code})\nRepo: {backup_repo}")
         raise
     except Exception as e:
         log.error(f"Unexpected error: {e}")
+        flush_logs()
         notify_telegram(telegram_config,
                         f"🚨 Backup failed: {e}\nRepo: {backup_repo}")
         sys.exit(1)